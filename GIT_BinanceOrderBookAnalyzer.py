@@ -35,9 +35,18 @@
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
 # Import necessary libraries
+import numpy as np   # For fast, vectorized sums over order book levels and trades.
+import orjson        # For fast parsing of the large depth and aggTrades JSON responses.
 import requests      # For making HTTP requests to external APIs (CoinMarketCap, Binance).
+from requests.adapters import HTTPAdapter # For configuring the connection pool used by the shared session.
+from urllib3.util.retry import Retry      # For automatically retrying transient HTTP failures.
+import os            # For checking the age of the local cache files.
+import pickle        # For saving and loading cached API data to and from disk.
 import sys           # For interacting with the system, specifically for writing progress/error messages to the console.
 import time          # For timing script execution and implementing sleep delays to manage API rate limits and loop frequency.
+import itertools     # For lazily taking the first N matching coins.
+import threading     # For the locks and events that coordinate rate limiting across worker threads.
+from dataclasses import dataclass # For the compact, fixed-field record holding each coin's results.
 from datetime import datetime
 from zoneinfo import ZoneInfo # For handling timezone-aware datetimes, ensuring timestamps are consistent.
 from concurrent.futures import ThreadPoolExecutor, as_completed # For managing concurrent API requests to improve performance.
@@ -46,6 +55,191 @@ from concurrent.futures import ThreadPoolExecutor, as_completed # For managing c
 # API and Data Fetching Functions
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
+# The number of worker threads fetching symbol data concurrently.
+# The weight budget below, not the thread count, sets the overall pace, so only enough
+# workers are needed to keep requests in flight while waiting on network round trips.
+MAX_WORKERS = 8
+
+# A single, shared HTTP session used for every API call in the script.
+# Bare `requests.get()` opens a brand new TCP + TLS connection for every request, and with
+# hundreds of depth/aggTrades calls per run those handshakes dominate the total runtime.
+# A session keeps connections alive in a pool so they are reused across requests.
+_SESSION = requests.Session()
+# Transient failures (rate limiting and server errors) are retried with a short backoff.
+# If every retry fails, the last response is returned rather than raised, so its status
+# and headers can still be inspected (see `throttle_on_response`).
+_RETRY_POLICY = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+# Each worker can have two requests in flight (see `fetch_and_process_symbol`), so the pool holds
+# two keep-alive connections per worker. No request ever has to open a fresh connection (or have
+# its connection discarded) because the pool is full.
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=2 * MAX_WORKERS, max_retries=_RETRY_POLICY))
+# Ask for compressed responses to reduce the bandwidth of the large order book payloads.
+_SESSION.headers.update({'Accept-Encoding': 'gzip'})
+
+# --- Rate Limiting ---
+# Binance limits each IP to 2400 request "weight" per minute. Instead of sleeping a fixed
+# amount between calls, every request takes tokens from a shared bucket equal to its weight,
+# so any number of worker threads can run while the overall rate stays within budget.
+WEIGHT_LIMIT_PER_MINUTE = 2400
+WEIGHT_BURST = 100
+# The refill rate leaves room for a full burst, so no 60-second window can ever use more than the limit.
+WEIGHT_PER_SECOND = (WEIGHT_LIMIT_PER_MINUTE - WEIGHT_BURST) / 60
+# The weight Binance charges for each endpoint used by this script.
+# The order book depth endpoint is not listed here because its weight depends on the requested limit.
+ENDPOINT_WEIGHTS = {"/fapi/v1/aggTrades": 20}
+# The weight of the depth endpoint for each range of requested levels, as (max_limit, weight) pairs.
+DEPTH_WEIGHTS = [(50, 2), (100, 5), (500, 10), (1000, 20)]
+# The only order book depths the Binance Futures depth endpoint accepts.
+VALID_DEPTH_LIMITS = [5, 10, 20, 50, 100, 500, 1000]
+# If Binance reports more used weight than this for the current minute, all workers
+# pause until the next minute window begins. The token bucket alone keeps a minute at or
+# below the limit, so this only fires when something else (e.g., another script on the
+# same IP) is using weight too: it is the point where the next request, at up to 20
+# weight, could take the minute over the limit.
+USED_WEIGHT_THRESHOLD = WEIGHT_LIMIT_PER_MINUTE - 20
+
+class TokenBucket:
+    """
+    A thread-safe token bucket rate limiter.
+    Tokens refill continuously at `rate` per second, up to a maximum of `capacity`.
+    `acquire(n)` blocks the calling thread until `n` tokens are available.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n=1):
+        while True:
+            with self.lock:
+                # Add the tokens that have accumulated since the last call.
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                # Not enough tokens yet; work out how long until there will be.
+                wait_seconds = (n - self.tokens) / self.rate
+            # Sleep outside the lock so other threads can still check the bucket.
+            time.sleep(wait_seconds)
+
+def request_weight(endpoint, params=None):
+    """Returns the Binance request weight of a call to `endpoint` with the given parameters."""
+    if endpoint == "/fapi/v1/depth":
+        limit = (params or {}).get('limit', 500)
+        for max_limit, weight in DEPTH_WEIGHTS:
+            if limit <= max_limit:
+                return weight
+        return DEPTH_WEIGHTS[-1][1]
+    return ENDPOINT_WEIGHTS.get(endpoint, 1)
+
+_BUCKET = TokenBucket(WEIGHT_PER_SECOND, WEIGHT_BURST)
+# The `time.monotonic()` time before which no worker may send a request, set when Binance
+# reports the weight limit is nearly used up or asks the script to back off.
+_pause_until = 0.0
+_PAUSE_LOCK = threading.Lock()
+
+def pause_requests(seconds, reason):
+    """
+    Blocks every worker from sending new requests for the given number of seconds.
+    A pause can only be extended: if one is already running and ends later, it is kept as is.
+    """
+    global _pause_until
+    with _PAUSE_LOCK:
+        new_deadline = time.monotonic() + seconds
+        if new_deadline <= _pause_until:
+            return # A longer pause is already in progress.
+        _pause_until = new_deadline
+    sys.stderr.write(f"\n{reason} Pausing requests for {seconds:.0f} seconds.\n")
+
+def wait_while_paused():
+    """Blocks the calling thread until no pause is in progress."""
+    while True:
+        with _PAUSE_LOCK:
+            remaining = _pause_until - time.monotonic()
+        if remaining <= 0:
+            return
+        # The pause may be extended while sleeping, so the deadline is checked again afterwards.
+        time.sleep(remaining)
+
+def header_int(response, name, default):
+    """
+    Returns the integer value of a response header, or `default` if the header is missing or not
+    a plain integer (e.g., a `Retry-After` given as an HTTP date).
+    """
+    try:
+        return int(response.headers.get(name, default))
+    except ValueError:
+        return default
+
+def throttle_on_response(response):
+    """
+    Pauses all workers when Binance signals that the IP is close to, or over, its limits.
+    - `X-MBX-USED-WEIGHT-1M`: if the used weight for the current minute is close to the limit,
+      wait until the next minute window starts. This catches cases the token bucket cannot see,
+      such as other scripts sharing the same IP.
+    - HTTP 429 (rate limited) or 418 (IP banned) responses that are still returned after retrying:
+      wait for as long as the `Retry-After` header asks.
+    """
+    if response.status_code in (418, 429):
+        retry_after = header_int(response, 'Retry-After', 60)
+        pause_requests(retry_after, f"Binance returned HTTP {response.status_code}.")
+        return
+    used_weight = header_int(response, 'X-MBX-USED-WEIGHT-1M', 0)
+    if used_weight > USED_WEIGHT_THRESHOLD:
+        pause_requests(60 - time.time() % 60, f"Used weight {used_weight} is near the limit.")
+
+# --- Local Caching ---
+# The list of tradable Binance symbols and the CMC rankings change slowly, so they are cached
+# to disk and reused until they expire instead of being downloaded again on every run.
+SYMBOLS_CACHE_FILE = "binance_symbols.cache"
+SYMBOLS_CACHE_TTL_SECONDS = 6 * 3600
+# A single file for every request size: the size changes from run to run with the hit rate, so
+# the largest listing fetched is kept and smaller requests are served from its first rows.
+CMC_CACHE_FILE = "cmc_listings.cache"
+CMC_CACHE_TTL_SECONDS = 20 * 60
+# The share of CMC coins that had a Binance Futures market on the last run, used to decide
+# how many CMC coins to request next time.
+HIT_RATE_CACHE_FILE = "cmc_hit_rate.cache"
+HIT_RATE_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# An in-memory copy of every cache entry read or written during this run, as
+# {filename: (saved_at_timestamp, data)}. A long-running process can then reuse
+# cached data across cycles without reading and unpickling the file each time.
+_MEMORY_CACHE = {}
+
+def load_cache(filename, max_age_seconds):
+    """
+    Returns the object stored in a cache file, or None if the file is missing,
+    older than `max_age_seconds`, or cannot be read.
+    """
+    if filename in _MEMORY_CACHE:
+        saved_at, data = _MEMORY_CACHE[filename]
+        if time.time() - saved_at <= max_age_seconds:
+            return data
+    try:
+        saved_at = os.path.getmtime(filename)
+        if time.time() - saved_at > max_age_seconds:
+            return None
+        with open(filename, 'rb') as f:
+            data = pickle.load(f)
+    except (OSError, pickle.PickleError, EOFError):
+        return None
+    _MEMORY_CACHE[filename] = (saved_at, data)
+    return data
+
+def save_cache(filename, data):
+    """Writes an object to a cache file. A failed write is reported but is not fatal."""
+    _MEMORY_CACHE[filename] = (time.time(), data)
+    try:
+        with open(filename, 'wb') as f:
+            pickle.dump(data, f)
+    except OSError as e:
+        sys.stderr.write(f"Warning: could not write cache file '{filename}': {e}\n")
+
 def read_api_key(filename="CoinMarketCapAPIKey.txt"):
     """
     Reads the CoinMarketCap API key from a local text file.
@@ -71,22 +265,32 @@ def get_cmc_market_data(api_key, limit):
     """
     Fetches the top cryptocurrencies sorted by market cap from the CoinMarketCap (CMC) API.
     This provides the initial, broad list of coins to consider for analysis.
+    Results are cached locally for a short time, which also saves CMC API credits. A cached
+    listing serves any request for at most as many coins as it holds.
     """
+    cached_data = load_cache(CMC_CACHE_FILE, CMC_CACHE_TTL_SECONDS)
+    if cached_data is not None and len(cached_data) >= limit:
+        print(f"Using cached top {limit} coins from CoinMarketCap.")
+        return cached_data[:limit]
+
     print(f"Fetching top {limit} coins from CoinMarketCap...")
     url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/listings/latest"
     # The header must include the API key for authentication.
     headers = {'Accepts': 'application/json', 'X-CMC_PRO_API_KEY': api_key}
     # Parameters specify the number of coins to fetch and to sort by market cap.
-    params = {'start': '1', 'limit': limit, 'convert': 'USD', 'sort': 'market_cap'}
+    params = {'start': 1, 'limit': limit, 'convert': 'USD', 'sort': 'market_cap'}
     try:
         # Make the GET request with a 10-second timeout.
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        response = _SESSION.get(url, headers=headers, params=params, timeout=10)
         # Raise an exception for bad status codes (e.g., 401 Unauthorized, 404 Not Found).
         response.raise_for_status()
         # Return the list of coin data from the JSON response.
-        return response.json().get('data', [])
-    # Catch any network-related errors during the request.
-    except requests.exceptions.RequestException as e:
+        data = orjson.loads(response.content).get('data', [])
+        if data:
+            save_cache(CMC_CACHE_FILE, data)
+        return data
+    # Catch any network-related errors during the request, or a response body that is not valid JSON.
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         sys.stderr.write(f"Error fetching CoinMarketCap data: {e}\n")
         return None
 
@@ -94,23 +298,32 @@ def get_binance_futures_symbols():
     """
     Fetches a set of all actively traded USDT-margined futures symbols from Binance.
     This is crucial for filtering the CMC list to only coins that are actually tradable on Binance Futures.
-    Using a set provides fast lookups (O(1) average time complexity).
+    Using a frozenset provides fast lookups (O(1) average time complexity) and makes it
+    clear the result is never modified after it is built (or loaded from the cache).
+    The symbol list rarely changes, so it is cached locally for several hours.
     """
+    cached_symbols = load_cache(SYMBOLS_CACHE_FILE, SYMBOLS_CACHE_TTL_SECONDS)
+    if cached_symbols:
+        print(f"Using {len(cached_symbols)} cached symbols from Binance Futures.")
+        return cached_symbols
+
     print("Fetching all tradable symbols from Binance Futures...")
     url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
     try:
-        response = requests.get(url, timeout=10)
+        response = _SESSION.get(url, timeout=10)
         response.raise_for_status()
-        data = response.json()
-        # Use a set comprehension for efficient creation.
+        # The exchangeInfo payload is large, so it is parsed from the raw bytes with orjson.
+        data = orjson.loads(response.content)
         # It filters for pairs quoted in USDT and with a 'TRADING' status.
-        symbols = {s['symbol'] for s in data['symbols'] if s['quoteAsset'] == 'USDT' and s['status'] == 'TRADING'}
+        symbols = frozenset(s['symbol'] for s in data['symbols'] if s['quoteAsset'] == 'USDT' and s['status'] == 'TRADING')
         print(f"Found {len(symbols)} active symbols on Binance Futures.")
+        if symbols:
+            save_cache(SYMBOLS_CACHE_FILE, symbols)
         return symbols
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         sys.stderr.write(f"Error fetching Binance symbols: {e}\n")
         # Return an empty set on failure so the program can handle it gracefully.
-        return set()
+        return frozenset()
 
 def api_get(endpoint, params=None):
     """
@@ -119,11 +332,16 @@ def api_get(endpoint, params=None):
     """
     base_url = "https://fapi.binance.com"
     url = base_url + endpoint
+    # Wait until the request fits within the rate limit before sending it.
+    wait_while_paused()
+    _BUCKET.acquire(request_weight(endpoint, params))
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = _SESSION.get(url, params=params, timeout=10)
+        throttle_on_response(response)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        # orjson parses the raw bytes several times faster than the standard library's json module.
+        return orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         # Log errors to standard error without crashing the program.
         sys.stderr.write(f"\nAPI request failed for {url} with params {params}: {e}\n")
         return None
@@ -132,6 +350,46 @@ def api_get(endpoint, params=None):
 # Core Analysis Functions
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
+# The value of a ratio whose denominator is zero (e.g., buy pressure with no sell pressure at all).
+INF = float('inf')
+
+def safe_ratio(numerator, denominator):
+    """Returns numerator / denominator, or infinity if the denominator is not positive."""
+    return numerator / denominator if denominator > 0 else INF
+
+def safe_ratios(numerators, denominators):
+    """The array version of `safe_ratio`: divides element-wise, giving infinity where the denominator is not positive."""
+    # Only the positions with a positive denominator are divided; the rest keep the infinity they start with.
+    # An infinite denominator is still positive, so inf / inf is divided and gives NaN; the warning it
+    # would raise is silenced, matching the scalar `safe_ratio`, which produces the same NaN silently.
+    with np.errstate(invalid='ignore'):
+        return np.divide(numerators, denominators, out=np.full_like(numerators, np.inf), where=denominators > 0)
+
+def to_binance_pairs(cmc_data):
+    """
+    Formats each CMC symbol to match Binance's standard (e.g., "BTC" -> "BTCUSDT"), in market cap order.
+    """
+    return [coin_data.get('symbol', '').upper() + "USDT" for coin_data in cmc_data]
+
+def match_binance_pairs(cmc_pairs, binance_symbols_set, count):
+    """
+    Returns up to `count` of the given Binance-formatted CMC pairs that trade on Binance Futures,
+    in market cap order.
+    """
+    # Different CMC coins can share a ticker symbol, so `dict.fromkeys` drops the repeats while keeping
+    # the first (highest market cap) occurrence; otherwise the same pair would be analyzed twice.
+    wanted_pairs = dict.fromkeys(cmc_pairs)
+    # Keep only the pairs tradable on Binance, stopping once the desired number of coins is reached.
+    return list(itertools.islice(filter(binance_symbols_set.__contains__, wanted_pairs), count))
+
+def cmc_rows_needed(coin_count, hit_rate):
+    """
+    Estimates how many CMC coins must be fetched to find `coin_count` Binance Futures pairs,
+    given the share of CMC coins that matched last time. The hit rate is floored at 30% so a
+    single unusual run cannot cause a huge request, and a small margin is added on top.
+    """
+    return int(coin_count / max(0.3, hit_rate)) + 10
+
 def calculate_passive_order_value(symbol, depth_limit):
     """
     Measures passive market intent by analyzing the order book.
@@ -139,14 +397,27 @@ def calculate_passive_order_value(symbol, depth_limit):
     It sums the notional value (price * quantity) of bids and asks up to a specified depth.
     A high "total_bids_value" suggests strong passive buying support (a "buy wall").
     A high "total_asks_value" suggests strong passive selling pressure (a "sell wall").
+
+    Choosing the depth is a tradeoff. Deeper books capture walls placed further from the price,
+    but cost more request weight (2 for up to 50 levels, 5 for 100, 10 for 500, 20 for 1000)
+    and a larger payload, while the far levels add little to the totals. The default of 500
+    levels keeps the walls in view at half the weight of a full 1000-level book.
     """
-    params = {'symbol': symbol, 'limit': depth_limit}
+    # Binance rejects any other depth, so round up to the smallest valid limit that covers the
+    # requested levels (e.g., 25 -> 50), then only sum the requested levels below.
+    request_limit = next((limit for limit in VALID_DEPTH_LIMITS if limit >= depth_limit), VALID_DEPTH_LIMITS[-1])
+    params = {'symbol': symbol, 'limit': request_limit}
     response = api_get("/fapi/v1/depth", params)
     if not response: return 0, 0
-    # Calculate the total value of all buy orders (bids) in the book.
-    total_bids_value = sum(float(p) * float(q) for p, q in response.get('bids', []))
+    # Convert the [price, quantity] string pairs into (levels x 2) float arrays in one step.
+    # The reshape keeps an empty side of the book as a (0 x 2) array, which sums to 0.
+    bids = np.array(response.get('bids', [])[:depth_limit], dtype=np.float64).reshape(-1, 2)
+    asks = np.array(response.get('asks', [])[:depth_limit], dtype=np.float64).reshape(-1, 2)
+    # Calculate the total value of all buy orders (bids) in the book, as the dot product of prices and quantities.
+    # `np.vdot` does the multiply and sum in one pass, without a temporary array of per-level values.
+    total_bids_value = float(np.vdot(bids[:, 0], bids[:, 1]))
     # Calculate the total value of all sell orders (asks) in the book.
-    total_asks_value = sum(float(p) * float(q) for p, q in response.get('asks', []))
+    total_asks_value = float(np.vdot(asks[:, 0], asks[:, 1]))
     return total_bids_value, total_asks_value
 
 def calculate_active_trade_value(symbol):
@@ -158,146 +429,179 @@ def calculate_active_trade_value(symbol):
     - Taker Sell: A market sell order that consumes liquidity from the bid side.
     The Binance API's 'm' flag in the trade data is `True` if the buyer is the maker, meaning it was a taker sell.
     It is `False` if the seller is the maker, meaning it was a taker buy.
+
+    This needs one request per symbol. The all-symbols `/fapi/v1/ticker/24hr` endpoint would be
+    a single request, but it only reports total volume with no taker buy/sell split, and it covers
+    24 hours rather than the most recent trades, so it cannot replace this measurement.
     """
     # Uses a fixed limit of 1000 (the maximum allowed) to get a robust sample of recent activity.
     params = {'symbol': symbol, 'limit': 1000}
     response = api_get("/fapi/v1/aggTrades", params)
     if not response: return 0, 0
-    total_taker_buy_value, total_taker_sell_value = 0, 0
-    for trade in response:
-        notional_value = float(trade['p']) * float(trade['q'])
-        # if 'm' is False, the aggressor was a buyer.
-        if not trade['m']:
-            total_taker_buy_value += notional_value
-        # if 'm' is True, the aggressor was a seller.
-        else:
-            total_taker_sell_value += notional_value
+    # Fill each array straight from the parsed trades, converting the price and quantity strings
+    # as they are read, without building an intermediate Python list first.
+    trade_count = len(response)
+    prices = np.fromiter((trade['p'] for trade in response), dtype=np.float64, count=trade_count)
+    quantities = np.fromiter((trade['q'] for trade in response), dtype=np.float64, count=trade_count)
+    makers = np.fromiter((trade['m'] for trade in response), dtype=bool, count=trade_count)
+    notional_values = prices * quantities
+    # if 'm' is False, the aggressor was a buyer.
+    total_taker_buy_value = float(notional_values[~makers].sum())
+    # if 'm' is True, the aggressor was a seller.
+    total_taker_sell_value = float(notional_values[makers].sum())
     return total_taker_buy_value, total_taker_sell_value
 
+@dataclass(slots=True, frozen=True)
+class CoinMetrics:
+    """
+    The analysis results for a single coin.
+    Using slots gives every record the same fixed set of attributes, which is lighter
+    and faster to access than a dictionary with the same keys.
+    """
+    coin: str
+    display_coin: str # The symbol without its quote asset, for readability (e.g., 'BTCUSDT' -> 'BTC').
+    limit_buy: int
+    limit_sell: int
+    market_buy: int
+    market_sell: int
+    limit_bs_ratio: float
+    market_bs_ratio: float
+
+# A helper pool that fetches each symbol's recent trades while its worker fetches the order book.
+_TRADES_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
 def fetch_and_process_symbol(symbol, order_book_depth):
     """
     The main "unit of work" for a single cryptocurrency.
     It orchestrates the fetching and initial calculation for one symbol.
     """
+    # The two requests below are independent, so the trades request is sent from a helper
+    # thread while this thread fetches the order book, overlapping their network round trips.
+    # Get the aggressive buy and sell pressure from recent trades.
+    trades_future = _TRADES_EXECUTOR.submit(calculate_active_trade_value, symbol)
     # Get the passive buy and sell pressure from the order book.
     limit_buy_value, limit_sell_value = calculate_passive_order_value(symbol, order_book_depth)
-    # This delay is CRITICAL. Making rapid, back-to-back API calls can easily trigger
-    # rate limits or IP bans. A small pause prevents this.
-    time.sleep(0.2)
-    # Get the aggressive buy and sell pressure from recent trades.
-    market_buy_value, market_sell_value = calculate_active_trade_value(symbol)
+    market_buy_value, market_sell_value = trades_future.result()
     
     # Calculate the Limit Order Buy/Sell Ratio.
     # A value > 1 means more money in buy orders than sell orders (bullish passive bias).
     # A value < 1 means more money in sell orders than buy orders (bearish passive bias).
-    limit_bs_ratio = limit_buy_value / limit_sell_value if limit_sell_value > 0 else float('inf')
+    limit_bs_ratio = safe_ratio(limit_buy_value, limit_sell_value)
     
     # Calculate the Market Order Buy/Sell Ratio.
     # A value > 1 means more aggressive buying than selling (bullish active pressure).
     # A value < 1 means more aggressive selling than buying (bearish active pressure).
-    market_bs_ratio = market_buy_value / market_sell_value if market_sell_value > 0 else float('inf')
+    market_bs_ratio = safe_ratio(market_buy_value, market_sell_value)
     
-    # Return a structured dictionary with all the calculated data.
-    return {
-        "coin": symbol, "limitBuy": int(round(limit_buy_value)),
-        "limitSell": int(round(limit_sell_value)), "marketBuy": int(round(market_buy_value)),
-        "marketSell": int(round(market_sell_value)), "limit_bs_ratio": limit_bs_ratio,
-        "market_bs_ratio": market_bs_ratio
-    }
+    # Return a structured record with all the calculated data.
+    return CoinMetrics(
+        coin=symbol, display_coin=symbol.removesuffix('USDT'), limit_buy=int(round(limit_buy_value)),
+        limit_sell=int(round(limit_sell_value)), market_buy=int(round(market_buy_value)),
+        market_sell=int(round(market_sell_value)), limit_bs_ratio=limit_bs_ratio,
+        market_bs_ratio=market_bs_ratio
+    )
+
+def rank_divergence_setups(limit_bs_ratios, market_bs_ratios):
+    """
+    The numerical core of the setup search, working on whole arrays of coins at once.
+    Takes the limit and market buy/sell ratios of every coin as float arrays and returns
+    (short_indices, limit_market_ratios, long_indices, market_limit_ratios).
+    The index arrays select the coins matching each setup, ordered from the strongest signal
+    to the weakest, and the ratio arrays hold the divergence metric for every coin.
+    """
+    # Calculate the ratio of ratios, which is the key metric for finding divergences.
+    # For shorts, we want to see how much larger the passive buy support is compared to the active sell pressure.
+    limit_market_ratios = safe_ratios(limit_bs_ratios, market_bs_ratios)
+    # For longs, we want to see how much larger the active buy pressure is compared to the passive sell pressure.
+    market_limit_ratios = safe_ratios(market_bs_ratios, limit_bs_ratios)
+
+    # --- SHORT SETUP LOGIC ---
+    # The condition `limit_bs_ratios > 1` means there are more limit buys than sells (a "buy wall").
+    # The condition `market_bs_ratios < 1` means there are more market sells than buys (aggressive selling).
+    # COMBINED: This setup finds coins where a supposed "buy wall" is actively being eaten away by sellers.
+    # This could signal that the support level is about to fail, making it a good short opportunity.
+    short_indices = np.flatnonzero((limit_bs_ratios > 1) & (market_bs_ratios < 1))
+    # Sort by the ratio descending, to show the most extreme examples first. A stable sort on the
+    # negated ratio keeps coins with equal ratios in their market cap order.
+    short_indices = short_indices[np.argsort(-limit_market_ratios[short_indices], kind='stable')]
+
+    # --- LONG SETUP LOGIC ---
+    # The condition `limit_bs_ratios < 1` means there are more limit sells than buys (a "sell wall").
+    # The condition `market_bs_ratios > 1` means there are more market buys than sells (aggressive buying).
+    # COMBINED: This setup finds coins where a supposed "sell wall" is actively being absorbed by buyers.
+    # This could signal that the resistance level is about to break, making it a good long opportunity.
+    long_indices = np.flatnonzero((limit_bs_ratios < 1) & (market_bs_ratios > 1))
+    # Sort by the ratio descending to prioritize the strongest absorption signals.
+    long_indices = long_indices[np.argsort(-market_limit_ratios[long_indices], kind='stable')]
+    return short_indices, limit_market_ratios, long_indices, market_limit_ratios
 
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 # Presentation Functions
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
+# Row templates for each table. The column widths and number formats are fixed, so they are
+# defined once here and filled in per row, keeping the layout separate from the table logic.
+SUMMARY_ROW_FORMAT = ("{coin:<12} | {limit_buy:>20,} | {limit_sell:>20,} | {market_buy:>20,} | "
+                      "{market_sell:>20,} | {limit_bs_ratio:>10.2f} | {market_bs_ratio:>11.2f}")
+SHORTS_ROW_FORMAT = "{coin:<12} | {limit_bs_ratio:>15.2f} | {market_bs_ratio:>15.2f} | {ratio:>20.2f}"
+LONGS_ROW_FORMAT = "{coin:<12} | {market_bs_ratio:>15.2f} | {limit_bs_ratio:>15.2f} | {ratio:>20.2f}"
+
+def write_table(title, header, rows, empty_message=None):
+    """
+    Writes a complete table (title, header, rows and separator lines) to the console in a single call,
+    instead of one print per line. If there are no rows, `empty_message` is shown in their place.
+    """
+    separator = "-" * len(header)
+    lines = ["\n\n" + title, separator, header, separator]
+    if rows:
+        lines.extend(rows)
+    elif empty_message:
+        lines.append(empty_message)
+    lines.append(separator)
+    sys.stdout.write("\n".join(lines) + "\n")
+
 def display_summary_table(results, current_time_str):
     """
     Prints the initial, formatted table of overall analysis results.
     This gives a raw data dump of all analyzed coins for a general market overview.
-    (Note: This function call is commented out in main(), but is kept for potential future use).
     """
-    print("\n\n--- Market Pressure Analysis ---")
     header = (f"{'Coin':<12} | {'Limit Buy ($)':>20} | {'Limit Sell ($)':>20} | {'Market Buy ($)':>20} | "
               f"{'Market Sell ($)':>20} | {'Limit B/S':>10} | {'Market B/S':>11}")
-    print("-" * len(header))
-    print(header)
-    print("-" * len(header))
-
+    rows = []
     for data in results:
-        # Cleans up the symbol name for better readability (e.g., 'BTCUSDT' -> 'BTC').
-        display_coin = data['coin'].replace('USDT', '')
         # Formats the numerical data for alignment and readability with commas.
-        row = (f"{display_coin:<12} | {data['limitBuy']:>20,} | {data['limitSell']:>20,} | "
-               f"{data['marketBuy']:>20,} | {data['marketSell']:>20,} | "
-               f"{data['limit_bs_ratio']:>10.2f} | {data['market_bs_ratio']:>11.2f}")
-        print(row)
-    print("-" * len(header))
+        rows.append(SUMMARY_ROW_FORMAT.format(
+            coin=data.display_coin, limit_buy=data.limit_buy, limit_sell=data.limit_sell,
+            market_buy=data.market_buy, market_sell=data.market_sell,
+            limit_bs_ratio=data.limit_bs_ratio, market_bs_ratio=data.market_bs_ratio))
+    write_table("--- Market Pressure Analysis ---", header, rows)
 
 def display_trade_setups(all_coin_data):
     """
     Filters, sorts, and displays the curated high-probability setup tables.
     This is the core output of the tool, where raw data is translated into actionable insights.
     """
-    # First, calculate the ratio of ratios, which is the key metric for finding divergences.
-    for coin in all_coin_data:
-        # For shorts, we want to see how much larger the passive buy support is compared to the active sell pressure.
-        if coin['market_bs_ratio'] > 0:
-            coin['limit_market_ratio'] = coin['limit_bs_ratio'] / coin['market_bs_ratio']
-        else:
-            coin['limit_market_ratio'] = float('inf') # Avoid division by zero
-        
-        # For longs, we want to see how much larger the active buy pressure is compared to the passive sell pressure.
-        if coin['limit_bs_ratio'] > 0:
-            coin['market_limit_ratio'] = coin['market_bs_ratio'] / coin['limit_bs_ratio']
-        else:
-            coin['market_limit_ratio'] = float('inf') # Avoid division by zero
-
-    # --- SHORT SETUP LOGIC ---
-    # The condition `c['limit_bs_ratio'] > 1` means there are more limit buys than sells (a "buy wall").
-    # The condition `c['market_bs_ratio'] < 1` means there are more market sells than buys (aggressive selling).
-    # COMBINED: This setup finds coins where a supposed "buy wall" is actively being eaten away by sellers.
-    # This could signal that the support level is about to fail, making it a good short opportunity.
-    potential_shorts = [c for c in all_coin_data if c['limit_bs_ratio'] > 1 and c['market_bs_ratio'] < 1]
-    # Sort by the `limit_market_ratio` descending, to show the most extreme examples first.
-    potential_shorts.sort(key=lambda x: x['limit_market_ratio'], reverse=True)
+    # Gather the two buy/sell ratios into column arrays so the setups can be found and ranked
+    # for all coins at once instead of looping over them in Python.
+    limit_bs_ratios = np.array([coin.limit_bs_ratio for coin in all_coin_data], dtype=np.float64)
+    market_bs_ratios = np.array([coin.market_bs_ratio for coin in all_coin_data], dtype=np.float64)
+    short_indices, limit_market_ratios, long_indices, market_limit_ratios = rank_divergence_setups(
+        limit_bs_ratios, market_bs_ratios)
+    # Pair each matching coin with its divergence ratio, in ranked order, for display.
+    potential_shorts = [(limit_market_ratios[i], all_coin_data[i]) for i in short_indices]
+    potential_longs = [(market_limit_ratios[i], all_coin_data[i]) for i in long_indices]
 
-    print("\n\n--- Table: Potential Shorts ---")
     header = f"{'Coin':<12} | {'Limit B/S':>15} | {'Market B/S':>15} | {'Limit/Market Ratio':>20}"
-    print("-" * len(header))
-    print(header)
-    print("-" * len(header))
-    if not potential_shorts:
-        print("No candidates found for this setup.")
-    else:
-        for data in potential_shorts:
-            display_coin = data['coin'].replace('USDT', '')
-            row = (f"{display_coin:<12} | {data['limit_bs_ratio']:>15.2f} | {data['market_bs_ratio']:>15.2f} | "
-                   f"{data['limit_market_ratio']:>20.2f}")
-            print(row)
-    print("-" * len(header))
-
-    # --- LONG SETUP LOGIC ---
-    # The condition `c['limit_bs_ratio'] < 1` means there are more limit sells than buys (a "sell wall").
-    # The condition `c['market_bs_ratio'] > 1` means there are more market buys than sells (aggressive buying).
-    # COMBINED: This setup finds coins where a supposed "sell wall" is actively being absorbed by buyers.
-    # This could signal that the resistance level is about to break, making it a good long opportunity.
-    potential_longs = [c for c in all_coin_data if c['limit_bs_ratio'] < 1 and c['market_bs_ratio'] > 1]
-    # Sort by the `market_limit_ratio` descending to prioritize the strongest absorption signals.
-    potential_longs.sort(key=lambda x: x['market_limit_ratio'], reverse=True)
+    rows = [SHORTS_ROW_FORMAT.format(coin=data.display_coin, limit_bs_ratio=data.limit_bs_ratio,
+                                     market_bs_ratio=data.market_bs_ratio, ratio=limit_market_ratio)
+            for limit_market_ratio, data in potential_shorts]
+    write_table("--- Table: Potential Shorts ---", header, rows, "No candidates found for this setup.")
 
-    print("\n\n--- Table: Potential Longs ---")
     header = f"{'Coin':<12} | {'Market B/S':>15} | {'Limit B/S':>15} | {'Market/Limit Ratio':>20}"
-    print("-" * len(header))
-    print(header)
-    print("-" * len(header))
-    if not potential_longs:
-        print("No candidates found for this setup.")
-    else:
-        for data in potential_longs:
-            display_coin = data['coin'].replace('USDT', '')
-            row = (f"{display_coin:<12} | {data['market_bs_ratio']:>15.2f} | {data['limit_bs_ratio']:>15.2f} | "
-                   f"{data['market_limit_ratio']:>20.2f}")
-            print(row)
-    print("-" * len(header))
+    rows = [LONGS_ROW_FORMAT.format(coin=data.display_coin, market_bs_ratio=data.market_bs_ratio,
+                                    limit_bs_ratio=data.limit_bs_ratio, ratio=market_limit_ratio)
+            for market_limit_ratio, data in potential_longs]
+    write_table("--- Table: Potential Longs ---", header, rows, "No candidates found for this setup.")
 
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 # Main Program Logic
@@ -342,6 +646,7 @@ def main():
     print("\n--- GitHub Actions Configuration ---")
     FINAL_COIN_COUNT = 150
     ORDER_BOOK_DEPTH = 500
+    PROGRESS_INTERVAL_SECONDS = 2
     print(f"Target Coins: {FINAL_COIN_COUNT}")
     print(f"Order Book Depth: {ORDER_BOOK_DEPTH}")
     print()
@@ -350,8 +655,13 @@ def main():
     
     # --- INITIAL DATA FETCHING ---
     # Fetch more coins than needed from CMC as a buffer, because not all top CMC coins
-    # will have a corresponding futures market on Binance.
-    cmc_fetch_limit = FINAL_COIN_COUNT + 200
+    # will have a corresponding futures market on Binance. The buffer is sized from the
+    # match rate of the previous run, falling back to a fixed buffer of 200 on the first run.
+    last_hit_rate = load_cache(HIT_RATE_CACHE_FILE, HIT_RATE_CACHE_TTL_SECONDS)
+    if last_hit_rate:
+        cmc_fetch_limit = cmc_rows_needed(FINAL_COIN_COUNT, last_hit_rate)
+    else:
+        cmc_fetch_limit = FINAL_COIN_COUNT + 200
     cmc_data = get_cmc_market_data(api_key, cmc_fetch_limit)
     binance_symbols_set = get_binance_futures_symbols()
 
@@ -362,16 +672,25 @@ def main():
     # --- DATA RECONCILIATION ---
     # Create the final list of coins to analyze by matching the CMC data with tradable Binance symbols.
     print("\nMatching top market cap coins with Binance Futures symbols...")
-    coins_to_analyze = []
-    for coin_data in cmc_data:
-        symbol = coin_data.get('symbol', '')
-        binance_symbol = symbol.upper() + "USDT" # Format to match Binance's standard (e.g., "BTC" -> "BTCUSDT").
-        if binance_symbol in binance_symbols_set:
-            coins_to_analyze.append(binance_symbol)
-        # Stop once the desired number of coins is reached.
-        if len(coins_to_analyze) == FINAL_COIN_COUNT:
-            break
-            
+    # The Binance-formatted pairs are built once and reused for matching and the hit rate.
+    cmc_pairs = to_binance_pairs(cmc_data)
+    coins_to_analyze = match_binance_pairs(cmc_pairs, binance_symbols_set, FINAL_COIN_COUNT)
+
+    # Remember how many CMC coins matched, to size the CMC request on the next run.
+    hit_rate = sum(pair in binance_symbols_set for pair in cmc_pairs) / len(cmc_pairs)
+    save_cache(HIT_RATE_CACHE_FILE, hit_rate)
+
+    # If the buffer was too small, ask for a longer listing that also covers the missing ranks.
+    # This is only possible if CMC returned a full batch, meaning there are more coins to fetch.
+    # The longer listing is served from the cache when it already holds enough rows; otherwise it
+    # is downloaded and replaces the cached one, so the next run can reuse it as well.
+    shortfall = FINAL_COIN_COUNT - len(coins_to_analyze)
+    if shortfall > 0 and len(cmc_data) == cmc_fetch_limit:
+        extended_cmc_data = get_cmc_market_data(api_key, cmc_fetch_limit + cmc_rows_needed(shortfall, hit_rate))
+        if extended_cmc_data:
+            cmc_pairs = to_binance_pairs(extended_cmc_data)
+            coins_to_analyze = match_binance_pairs(cmc_pairs, binance_symbols_set, FINAL_COIN_COUNT)
+
     if not coins_to_analyze:
         print("No matching coins found between CoinMarketCap and Binance Futures.")
         return
@@ -399,25 +718,32 @@ def main():
                 future_to_symbol = {executor.submit(fetch_and_process_symbol, symbol, ORDER_BOOK_DEPTH): symbol for symbol in coins_to_analyze}
                 
                 # `as_completed` yields futures as they finish, allowing for real-time progress updates.
+                last_progress_time = 0.0
                 for i, future in enumerate(as_completed(future_to_symbol), 1):
                     symbol = future_to_symbol[future]
                     try:
                         result = future.result()
                         if result:
                             current_run_data.append(result)
-                        time.sleep(0.05) # Small sleep to be gentle on the CPU and API.
                     except Exception as exc:
                         sys.stderr.write(f"\n{symbol} generated an exception: {exc}\n")
                     
                     # This creates a dynamic, single-line progress bar in the console.
-                    progress_text = f"Processing ({i}/{total_symbols}): {symbol}".ljust(60)
-                    sys.stdout.write(f"\r{progress_text}")
-                    sys.stdout.flush()
+                    # It is redrawn at most 10 times per second (plus the final update), so a burst
+                    # of completions does not turn into a burst of console writes and flushes.
+                    now = time.monotonic()
+                    if now - last_progress_time >= 0.1 or i == total_symbols:
+                        progress_text = f"Processing ({i}/{total_symbols}): {symbol}".ljust(60)
+                        sys.stdout.write(f"\r{progress_text}")
+                        sys.stdout.flush()
+                        last_progress_time = now
 
             print() # Move to the next line after the progress bar is complete.
 
             # Sort the results to match the original market cap order for consistency.
-            current_run_data.sort(key=lambda x: coins_to_analyze.index(x['coin']))
+            # A symbol -> position lookup avoids an O(N) `list.index` scan for every result.
+            market_cap_rank = {symbol: i for i, symbol in enumerate(coins_to_analyze)}
+            current_run_data.sort(key=lambda x: market_cap_rank[x.coin])
             
             # Get the current timestamp in a user-friendly timezone (IST).
             utc_now = datetime.now(ZoneInfo("UTC"))
@@ -462,38 +788,47 @@ def main():
     '''
     # --- SINGLE ANALYSIS RUN (GitHub Action Workflow) ---
     try:
-        current_run_data = []
         total_symbols = len(coins_to_analyze)
+        # One slot per coin, in market cap order. Each result is written straight into its coin's
+        # slot as it arrives, so the results end up in market cap order without a sort.
+        current_run_data = [None] * total_symbols
         
-        # Using max_workers=1 for sequential processing to avoid API bans in CI/CD.
-        # Increase cautiously if GHA execution time is too long.
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future_to_symbol = {executor.submit(fetch_and_process_symbol, symbol, ORDER_BOOK_DEPTH): symbol for symbol in coins_to_analyze}
+        # The work is network-bound, so several symbols are fetched in parallel.
+        # API bans are avoided by the shared rate limiter in `api_get`, not by running sequentially.
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            future_to_position = {executor.submit(fetch_and_process_symbol, symbol, ORDER_BOOK_DEPTH): position
+                                  for position, symbol in enumerate(coins_to_analyze)}
             
             print("\nProcessing symbols (this may take a few minutes)...")
             count = 0
-            for future in as_completed(future_to_symbol):
-                symbol = future_to_symbol[future]
+            last_progress_time = 0.0
+            for future in as_completed(future_to_position):
+                position = future_to_position[future]
+                symbol = coins_to_analyze[position]
                 count += 1
                 try:
-                    result = future.result()
-                    if result:
-                        current_run_data.append(result)
-                    
-                    # Simple progress log specifically for GHA (avoids \r issues)
-                    if count % 10 == 0 or count == total_symbols:
-                        print(f"Progress: {count}/{total_symbols} completed.")
-                        
-                    # Sleep to manage rate limits
-                    time.sleep(0.01) 
+                    current_run_data[position] = future.result()
                 except Exception as exc:
                     # Log error but continue processing others
                     sys.stderr.write(f"Warning: {symbol} generated an exception: {exc}\n")
 
+                # Simple progress log specifically for GHA (avoids \r issues).
+                # Progress is written every 10th symbol (plus a final line). With many workers, symbols
+                # can complete in quick bursts, so a line is also skipped if the previous one was
+                # written less than PROGRESS_INTERVAL_SECONDS ago.
+                # Only this loop prints progress, so no lock is needed around the output.
+                if count == total_symbols:
+                    print(f"Progress: {count}/{total_symbols} completed.")
+                elif count % 10 == 0:
+                    now = time.monotonic()
+                    if now - last_progress_time >= PROGRESS_INTERVAL_SECONDS:
+                        print(f"Progress: {count}/{total_symbols} completed.")
+                        last_progress_time = now
+
         print("\nData gathering complete. Generating report now...")
 
-        # Sort results by original CMC market cap order
-        current_run_data.sort(key=lambda x: coins_to_analyze.index(x['coin']))
+        # Drop the empty slots of symbols that failed, keeping the market cap order of the rest.
+        current_run_data = [result for result in current_run_data if result is not None]
         
         # Get timestamp
         try:
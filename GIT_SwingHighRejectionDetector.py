@@ -4,14 +4,18 @@
 # These libraries provide the necessary functions for web requests, time handling,
 # console output, and high-performance parallel processing.
 
+import orjson    # A fast JSON parser, used to decode the Binance API responses.
 import requests  # The primary library for making HTTP requests to the Binance API.
+from requests.adapters import HTTPAdapter # Keeps a pool of reusable connections open to Binance.
+from urllib3.util.retry import Retry     # Retries requests that fail with a transient server error.
 import datetime  # Used for getting the current timestamp for found signals.
 import time      # Used to measure the script's total runtime and to add small delays.
-import pytz      # Handles timezone conversions, ensuring the output time is in IST.
 import sys       # Provides access to system-specific parameters and functions, used here for dynamic console text.
 import threading # Essential for managing concurrent operations safely, specifically the console output lock.
-from concurrent.futures import ThreadPoolExecutor # A high-level interface for running tasks in parallel using threads.
-from itertools import repeat # A utility to provide the same argument to all function calls in the executor map.
+import itertools # Provides `count`, a thread-safe running counter for the progress display.
+from concurrent.futures import ThreadPoolExecutor, as_completed # A high-level interface for running tasks in parallel using threads.
+from operator import itemgetter # Reads several fields of a dict in one call.
+from zoneinfo import ZoneInfo # Handles timezone conversions, ensuring the output time is in IST.
 
 # =============================================================================
 # === Configuration & Global State ===
@@ -21,64 +25,139 @@ from itertools import repeat # A utility to provide the same argument to all fun
 
 # The market timeframe to analyze. '2h' means each candle represents 2 hours.
 TIMEFRAME = '2h'
-# The number of concurrent threads to run. A higher number speeds up the scan
-# but increases the risk of being rate-limited by the Binance API.
-MAX_WORKERS = 3
-# A small delay added to each thread's execution. This helps to prevent
-# overwhelming the API with too many requests in a very short time.
-SLEEP_DURATION = 0.4
+# The number of concurrent threads to run. The work is almost entirely waiting on
+# the network, so more requests in flight shorten the scan. A klines request with
+# limit=4 costs 1 weight, so even a full scan of every symbol stays far below
+# Binance's 2400 weight per minute budget.
+MAX_WORKERS = 8
+# --- Rate limiting ---
+# Binance allows 2400 request weight per minute per IP. All worker threads share one
+# token bucket, so only the combined request rate is capped; a worker only waits when
+# the budget is actually running low. The burst is held back from the per-second
+# rate so a full minute (burst included) never exceeds the limit.
+WEIGHT_LIMIT_PER_MINUTE = 2400
+WEIGHT_BURST = 100
+WEIGHT_PER_SECOND = (WEIGHT_LIMIT_PER_MINUTE - WEIGHT_BURST) / 60
+# A klines request with limit below 100 costs 1 weight.
+KLINES_WEIGHT = 1
 
 TIME_BETWEEN_SCANS_IN_MINUTES = 1
 
+# The timezone used for alert timestamps, loaded once rather than on every match.
+IST_TZ = ZoneInfo('Asia/Kolkata')
+
+# --- Shared HTTP session ---
+# A single Session reuses keep-alive connections, so the TCP and TLS handshake with
+# fapi.binance.com is paid once per pooled connection instead of once per request.
+# The pool holds one connection per worker thread.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=MAX_WORKERS,
+    pool_maxsize=MAX_WORKERS,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504]),
+))
+SESSION.headers.update({"User-Agent": "SwingHighRejectionDetector/1.0"})
+# (connect, read) timeouts in seconds: fail fast on a dead connection, allow time for the body.
+REQUEST_TIMEOUT = (3, 10)
+# The klines endpoint is the same for every symbol; only the query parameters change.
+KLINES_URL = "https://fapi.binance.com/fapi/v1/klines"
+
+# --- Symbol list cache ---
+# Futures listings change rarely, so the exchangeInfo response (the largest one the
+# scanner downloads) is reused for an hour instead of being fetched every scan.
+SYMBOLS_CACHE_TTL_SECONDS = 60 * 60
+_symbols_cache = {"ts": 0.0, "symbols": []}
+
 # --- Global variables for tracking progress across all threads ---
 # A counter for the number of symbols processed so far. Must be global to be
-# shared by all threads.
-processed_count = 0
+# shared by all threads. `next()` on an `itertools.count` is a single C call
+# that the GIL makes atomic, so threads can advance it without taking the lock.
+processed_counter = itertools.count(1)
 # A threading.Lock object. This is CRITICAL for preventing a "race condition"
 # where multiple threads try to write to the console at the same time,
 # resulting in garbled text. Only one thread can "hold" the lock at a time.
 lock = threading.Lock()
 
+class TokenBucket:
+    """
+    A thread-safe token bucket rate limiter.
+    Tokens refill continuously at `rate` per second, up to a maximum of `capacity`.
+    `acquire(n)` blocks the calling thread until `n` tokens are available.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n=1):
+        while True:
+            with self.lock:
+                # Add the tokens that have accumulated since the last call.
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                # Not enough tokens yet; work out how long until there will be.
+                wait_seconds = (n - self.tokens) / self.rate
+            # Sleep outside the lock so other threads can still check the bucket.
+            time.sleep(wait_seconds)
+
+bucket = TokenBucket(WEIGHT_PER_SECOND, WEIGHT_BURST)
+
 # =============================================================================
 # === Core Functions ===
 # =============================================================================
 
 def countdown_timer(minutes):
-    """Displays a countdown timer for the specified number of minutes."""
-    total_seconds = minutes * 60
-    for i in range(total_seconds, -1, -1):
-        mins, secs = divmod(i, 60)
-        timer_display = f"Next result in {mins:02d}:{secs:02d}"
-        #print(timer_display, end='\r')
-        time.sleep(1)
+    """Waits for the specified number of minutes before the next scan."""
+    # The live "Next result in MM:SS" display is disabled, so there is nothing to
+    # update each second; a single sleep covers the whole wait.
+    time.sleep(minutes * 60)
+    # Print a separator for the next cycle
     print("\n\n" + "-" * 65 + "\n")
 
 def get_futures_symbols():
     """
     Fetches all actively trading USDT-paired PERPETUAL futures symbols.
+    The list is cached for SYMBOLS_CACHE_TTL_SECONDS; if a refresh fails, the
+    previously cached list is used.
     """
+    if _symbols_cache["symbols"] and time.monotonic() - _symbols_cache["ts"] < SYMBOLS_CACHE_TTL_SECONDS:
+        return _symbols_cache["symbols"]
+
     print("Fetching all available USDT perpetual futures symbols...")
     url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
     try:
-        response = requests.get(url, timeout=10)
+        response = SESSION.get(url, timeout=REQUEST_TIMEOUT)
         # Raise an error if the API returns a non-200 status (e.g., 404, 500).
         response.raise_for_status()
-        data = response.json()
+        # exchangeInfo is the largest response the scanner downloads; orjson decodes it
+        # several times faster than the standard library parser behind `response.json()`.
+        data = orjson.loads(response.content)
 
+        # Pull the four fields the filter needs out of each entry in a single call.
+        symbol_fields = itemgetter('symbol', 'quoteAsset', 'status', 'contractType')
         symbols = [
-            s['symbol'] for s in data['symbols']
+            symbol for symbol, quote_asset, status, contract_type in map(symbol_fields, data['symbols'])
             # 1. Checks that the pair is priced in USDT.
-            if s['quoteAsset'] == 'USDT'
+            if quote_asset == 'USDT'
             # 2. Ensures the symbol is actively trading.
-            and s['status'] == 'TRADING'
+            and status == 'TRADING'
             # 3. Ensures fetching only perpetual contracts.
-            and s['contractType'] == 'PERPETUAL'
+            and contract_type == 'PERPETUAL'
         ]
+        _symbols_cache["ts"] = time.monotonic()
+        _symbols_cache["symbols"] = symbols
         return symbols
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         # Handle potential network errors or API downtime gracefully.
         print(f"Error fetching symbols: {e}")
-        return []
+        # Fall back to the last known list (empty if there never was one).
+        return _symbols_cache["symbols"]
 
 def get_candle_data(symbol, interval='2h'):
     """
@@ -88,12 +167,15 @@ def get_candle_data(symbol, interval='2h'):
     """
     # 'limit=4' retrieves the last 4 candles. This includes the current, live, unclosed
     # candle and the three fully closed candles that preceded it.
-    url = f"https://fapi.binance.com/fapi/v1/klines?symbol={symbol}&interval={interval}&limit=4"
+    params = {'symbol': symbol, 'interval': interval, 'limit': 4}
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException:
+        response = SESSION.get(KLINES_URL, params=params, timeout=REQUEST_TIMEOUT)
+        # A failed request (e.g. a delisted symbol) is dropped by its status code alone,
+        # without decoding the error body or raising an exception.
+        if response.status_code != 200:
+            return None
+        return orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError):
         # Return None if a specific symbol fails, allowing the scanner to continue.
         return None
 
@@ -103,24 +185,21 @@ def check_conditions(symbol, total_symbols):
     applies the pattern-matching logic, and prints a formatted alert if all
     conditions are met.
     """
-    global processed_count
-
     # --- Dynamic Status Update ---
     # This block provides the real-time "Processing (X/Y) SYMBOL" feedback.
-    # The 'with lock:' statement ensures that only one thread can execute this
-    # block at a time, preventing jumbled output.
-    with lock:
-        processed_count += 1
-        # The '\r' (carriage return) character moves the cursor to the beginning
-        # of the line without moving down. This allows the next write to
-        # overwrite the current line, creating a dynamic updating effect.
-        # The padding `{symbol:<15}` ensures the line is long enough to
-        # overwrite previous, shorter symbol names completely.
-        status_message = f"Processing ({processed_count}/{total_symbols}) {symbol:<15}\r"
-        #sys.stdout.write(status_message)
-        #sys.stdout.flush() # Forces the output to be written to the console immediately.
-
-    time.sleep(SLEEP_DURATION)
+    processed_count = next(processed_counter)
+    # The '\r' (carriage return) character moves the cursor to the beginning
+    # of the line without moving down. This allows the next write to
+    # overwrite the current line, creating a dynamic updating effect.
+    # The padding `{symbol:<15}` ensures the line is long enough to
+    # overwrite previous, shorter symbol names completely.
+    status_message = f"Processing ({processed_count}/{total_symbols}) {symbol:<15}\r"
+    # If re-enabled, the write must go inside 'with lock:' so it cannot interleave with an alert.
+    #with lock:
+    #    sys.stdout.write(status_message)
+    #    sys.stdout.flush() # Forces the output to be written to the console immediately.
+
+    bucket.acquire(KLINES_WEIGHT)
     klines = get_candle_data(symbol, TIMEFRAME)
 
     # --- Data Validation ---
@@ -131,70 +210,79 @@ def check_conditions(symbol, total_symbols):
     # --- Candle Unpacking and Preparation ---
     # The script now extracts the OHLC data for the last three available candles.
     # Binance API format: [timestamp, open, high, low, close, volume, ...]
+    # Binance sends prices as strings, so each one is converted with `float` and unpacked
+    # straight into named variables for better readability, mirroring the Pine Script
+    # logic where [0] is current, [1] is previous, etc.
     try:
         # klines[-1]: The last element, representing the CURRENT, LIVE, UNCLOSED candle.
-        current_candle = [float(p) for p in klines[-1][1:5]]
+        o_curr, h_curr, l_curr, c_curr = map(float, klines[-1][1:5])
         # klines[-2]: The second to last element, the MOST RECENTLY CLOSED candle.
-        mid_candle = [float(p) for p in klines[-2][1:5]]
+        o_mid,  h_mid,  l_mid,  c_mid  = map(float, klines[-2][1:5])
         # klines[-3]: The third to last, the SECOND MOST RECENTLY CLOSED candle.
-        left_candle = [float(p) for p in klines[-3][1:5]]
+        o_left, h_left, l_left, c_left = map(float, klines[-3][1:5])
     except (ValueError, IndexError):
         # If there's an issue with the data format, skip this symbol.
         return
 
-    # Assigning OHLC values to named variables for better readability, mirroring
-    # the Pine Script logic where [0] is current, [1] is previous, etc.
-    o_curr, h_curr, l_curr, c_curr = current_candle
-    o_mid,  h_mid,  l_mid,  c_mid  = mid_candle
-    o_left, h_left, l_left, c_left = left_candle
-
     # --- Pattern Logic: The "Swing High Rejection" translated to Python ---
-    # Each rule checks a specific piece of the 3-candle story.
+    # Each rule checks a specific piece of the 3-candle story. The rules are checked
+    # one at a time and the function returns at the first one that fails, so most
+    # symbols are rejected after a single comparison. Plain comparisons come first;
+    # the rules that need `max`/`abs` are only evaluated for the few candidates left.
 
     # Rule 1: The current, live candle must be bearish. This is the trigger.
-    rule1 = c_curr < o_curr
-    # Rule 2: The sequence must start with a bullish candle. This shows initial buying interest.
-    rule2 = c_left > o_left
+    if not c_curr < o_curr:
+        return
+    # Rule 6: The current candle's high must be lower than the middle candle's high, confirming
+    # that the downward momentum is continuing.
+    if not h_curr < h_mid:
+        return
     # Rule 3: The middle candle must make a higher high. This is the "Swing High" formation,
     # often interpreted as a "liquidity grab" or "stop hunt".
-    rule3 = h_left < h_mid
+    if not h_left < h_mid:
+        return
+    # Rule 5: The middle candle's low must remain above the left candle's open.
+    if not o_left < l_mid:
+        return
+    # Rule 2: The sequence must start with a bullish candle. This shows initial buying interest.
+    if not c_left > o_left:
+        return
     # Rule 4: The middle candle's body must be rejected back below the left candle's high.
     # This is a powerful sign of failure; the market couldn't sustain the new high.
     mid_candle_body_top = max(o_mid, c_mid)
-    rule4 = mid_candle_body_top < h_left
-    # Rule 5: The middle candle's low must remain above the left candle's open.
-    rule5 = o_left < l_mid
-    # Rule 6: The current candle's high must be lower than the middle candle's high, confirming
-    # that the downward momentum is continuing.
-    rule6 = h_curr < h_mid
+    if not mid_candle_body_top < h_left:
+        return
     # Rule 7: The middle candle's body must be smaller than the left candle's body. This signals
     # indecision or weakness at the peak, despite the higher high.
     mid_candle_body_size = abs(o_mid - c_mid)
     left_candle_body_size = abs(o_left - c_left)
-    rule7 = mid_candle_body_size < left_candle_body_size
+    if not mid_candle_body_size < left_candle_body_size:
+        return
 
     # --- Signal Confirmation and Output ---
-    # The `all()` function returns True only if every single rule in the list is True.
-    if all([rule1, rule2, rule3, rule4, rule5, rule6, rule7]):
-        # The live price is simply the close of the current (unclosed) candle.
-        current_price = c_curr
-        # Get the current time and format it for the IST timezone.
-        ist_tz = pytz.timezone('Asia/Kolkata')
-        ist_time = datetime.datetime.now(ist_tz).strftime('%Y-%m-%d %H:%M:%S IST')
-
-        # This block ensures the alert printout doesn't clash with the status line.
-        with lock:
-            # First, overwrite the "Processing..." line with blank spaces to clear it.
-            sys.stdout.write(" " * 60 + "\r")
-            sys.stdout.flush()
-
-            # Then, print the formatted alert.
-            chart_url = f"https://binance.com/en/futures/{symbol}"
-            print(f"Coin: {symbol}")
-            print(f"Price: {current_price}")
-            print(f"Time: {ist_time}")
-            print(f"URL: {chart_url}")
-            print("\n")
+    # Reaching this point means every rule passed.
+    # The live price is simply the close of the current (unclosed) candle.
+    current_price = c_curr
+    # Get the current time and format it for the IST timezone.
+    ist_time = datetime.datetime.now(IST_TZ).strftime('%Y-%m-%d %H:%M:%S IST')
+
+    # The whole alert is built as one string first: blank spaces that overwrite the
+    # "Processing..." line, followed by the formatted alert.
+    chart_url = f"https://binance.com/en/futures/{symbol}"
+    alert = (
+        " " * 60 + "\r"
+        f"Coin: {symbol}\n"
+        f"Price: {current_price}\n"
+        f"Time: {ist_time}\n"
+        f"URL: {chart_url}\n"
+        "\n\n"
+    )
+
+    # This block ensures the alert printout doesn't clash with the status line.
+    # A single write keeps the time spent holding the lock to a minimum.
+    with lock:
+        sys.stdout.write(alert)
+        sys.stdout.flush()
 
 def main():
     """
@@ -216,10 +304,11 @@ def main():
     while True:
         # --- Initialization ---
         start_time = time.time() # Record the script's start time for runtime calculation.
-        global processed_count
-        processed_count = 0
+        global processed_counter
+        processed_counter = itertools.count(1)
 
-        print("Fetching all Binance Futures symbols...")
+        # The symbol list is cached between scans (see SYMBOLS_CACHE_TTL_SECONDS), so this
+        # only downloads exchangeInfo, and prints its own message, when the cache has expired.
         symbols = get_futures_symbols()
 
         if not symbols:
@@ -233,12 +322,18 @@ def main():
         # --- Concurrent Execution ---
         # The ThreadPoolExecutor manages a pool of worker threads.
         with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            # `executor.map` is a powerful function that applies `check_conditions`
-            # to every symbol in the `symbols` list. It automatically distributes
-            # the work among the available threads in the pool.
-            # `repeat(total_symbols)` is used to pass the same `total_symbols` value
-            # as the second argument to every call of `check_conditions`.
-            executor.map(check_conditions, symbols, repeat(total_symbols))
+            # One `check_conditions` task is submitted per symbol, and the pool
+            # distributes them among the available threads.
+            future_to_symbol = {executor.submit(check_conditions, symbol, total_symbols): symbol for symbol in symbols}
+            # `as_completed` yields each task as soon as it finishes, whatever its
+            # position in the list, so one slow symbol never holds up the others.
+            for future in as_completed(future_to_symbol):
+                try:
+                    future.result()
+                except Exception as exc:
+                    # Report the failure but keep scanning the remaining symbols.
+                    with lock:
+                        sys.stderr.write(f"Warning: {future_to_symbol[future]} generated an exception: {exc}\n")
 
         # --- Finalization and Reporting ---
         end_time = time.time()